@@ -1,14 +1,90 @@
+import json
 import logging
+import os
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Identificador da requisição corrente, propagado para as threads que atendem o endpoint
+request_id_atual: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Anexa o identificador da requisição corrente a cada registro de log.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_atual.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formata os registros de log como uma linha JSON.
+
+    A mensagem só é montada aqui, quando o registro já passou pelo filtro de nível,
+    por isso as chamadas devem usar argumentos posicionais em vez de f-strings.
+    Campos adicionais podem ser enviados com `extra={"campos": {...}}`.
+    """
+
+    def format(self, record):
+        registro = {
+            "timestamp": self.formatTime(record),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", request_id_atual.get()),
+            "mensagem": record.getMessage(),
+        }
+        registro.update(getattr(record, "campos", {}))
+        if record.exc_info:
+            registro["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+# Loggers do uvicorn, que por padrão têm handlers próprios com saída em texto
+LOGGERS_UVICORN = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def criar_handler_json():
+    """
+    Cria um handler que escreve os registros em JSON com o identificador da requisição.
+
+    Retorna:
+        logging.Handler: O handler configurado.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    return handler
+
 
 def obter_logger_e_configuracao():
     """
-    Configura o logger padrão para o nível de informação e formato especificado.
+    Configura o logger padrão com saída em JSON, no nível definido pela variável LOG_LEVEL.
+
+    O nível vale apenas para o logger da aplicação. O logger raiz permanece em WARNING para que
+    bibliotecas como urllib3 e selenium não registrem mensagens de depuração. Os loggers do
+    uvicorn passam a usar o mesmo formato JSON.
 
     Retorna:
         logging.Logger: Um objeto de logger com as configurações padrões.
     """
-    logging.basicConfig(
-        level=logging.INFO, format="[%(levelname)s] %(asctime)s - %(message)s"
-    )
+    logging.basicConfig(level=logging.WARNING, handlers=[criar_handler_json()])
+
+    for nome in LOGGERS_UVICORN:
+        logger_uvicorn = logging.getLogger(nome)
+        for handler in logger_uvicorn.handlers:
+            if not isinstance(handler.formatter, JsonFormatter):
+                handler.setFormatter(JsonFormatter())
+                handler.addFilter(RequestIdFilter())
+        if not logger_uvicorn.handlers and not logger_uvicorn.propagate:
+            logger_uvicorn.addHandler(criar_handler_json())
+
     logger = logging.getLogger("fastapi")
-    return logger
\ No newline at end of file
+    logger.setLevel(LOG_LEVEL)
+    return logger
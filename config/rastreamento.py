@@ -0,0 +1,77 @@
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+
+from config.loggger import obter_logger_e_configuracao, request_id_atual
+
+load_dotenv()
+
+logger = obter_logger_e_configuracao()
+
+# Limite, em milissegundos, a partir do qual uma requisição é registrada como lenta
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+
+# Etapas já concluídas na requisição corrente, na forma (nome, duração em ms)
+spans_atuais: ContextVar[list | None] = ContextVar("spans", default=None)
+
+
+@contextmanager
+def span(nome):
+    """
+    Mede a duração de uma etapa do processamento e a registra na requisição corrente.
+
+    Args:
+        nome (str): Nome da etapa, como "bcb_fetch", "parse" ou "predict".
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        spans = spans_atuais.get()
+        if spans is not None:
+            spans.append((nome, round(duracao_ms, 2)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Etapa %s concluída em %.2f ms.", nome, duracao_ms,
+                         extra={"campos": {"span": nome, "duracao_ms": round(duracao_ms, 2)}})
+
+
+async def middleware_rastreamento(request, call_next):
+    """
+    Atribui um identificador a cada requisição, registra sua duração e emite
+    o log de requisição lenta quando o limite SLOW_REQUEST_MS é ultrapassado.
+
+    O identificador é lido do cabeçalho X-Request-ID, quando presente, e devolvido na resposta.
+    """
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token_request_id = request_id_atual.set(request_id)
+    spans = []
+    token_spans = spans_atuais.set(spans)
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        duracao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        # O uvicorn já registra cada requisição; aqui ela só é repetida, com a duração, no nível DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s %s em %.2f ms.", request.method, request.url.path, status, duracao_ms,
+                         extra={"campos": {"metodo": request.method, "caminho": request.url.path,
+                                           "status": status, "duracao_ms": duracao_ms}})
+        if duracao_ms > SLOW_REQUEST_MS:
+            logger.warning("Requisição lenta: %s %s levou %.2f ms.", request.method, request.url.path, duracao_ms,
+                           extra={"campos": {"metodo": request.method, "caminho": request.url.path,
+                                             "status": status, "duracao_ms": duracao_ms,
+                                             "limite_ms": SLOW_REQUEST_MS,
+                                             "spans": [{"span": nome, "duracao_ms": duracao}
+                                                       for nome, duracao in spans]}})
+        spans_atuais.reset(token_spans)
+        request_id_atual.reset(token_request_id)
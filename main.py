@@ -1,7 +1,11 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 
+from config.rastreamento import middleware_rastreamento
 from config.security import commom_verificacao_api_token
 from router.api import router
+from service.agendador_service import AgendadorService
 
 description = """
 PrecatoryAPI foi desenvolvida para auxiliar no cálculo e automação de processos relacionados a precatórios. 🧮
@@ -13,6 +17,14 @@ PrecatoryAPI foi desenvolvida para auxiliar no cálculo e automação de process
 * Rotas protegidas por token de API.
 """
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mantém a série da SELIC, a tabela do CJF e o modelo atualizados em segundo plano
+    agendador = AgendadorService()
+    agendador.iniciar()
+    yield
+    await agendador.parar()
+
 app = FastAPI(
     title="PrecatoryAPI",
     description=description,
@@ -27,6 +39,9 @@ app = FastAPI(
         "url": "https://www.gnu.org/licenses/gpl-3.0.pt-br.html",
     },
     dependencies=[Depends(commom_verificacao_api_token)],
+    lifespan=lifespan,
 )
 
+app.middleware("http")(middleware_rastreamento)
+
 app.include_router(router)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 
 import requests
-from fastapi import Response, HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter
 from fastapi.responses import FileResponse
 
 from config.loggger import obter_logger_e_configuracao
@@ -23,7 +23,7 @@ router = APIRouter(
     status_code=200
 )
 async def get_tipos_tabela_de_correcao():
-    logger.info(f"Requisição de buscar os tipos de tabela de correção recebida.")
+    logger.debug("Requisição de buscar os tipos de tabela de correção recebida.")
     return [tipo.value for tipo in TipoDeTabelaCorrecao]
 
 @router.get(
@@ -33,7 +33,8 @@ async def get_tipos_tabela_de_correcao():
     status_code=200
 )
 def get_last_tabela_de_correcao(tipo_tabela: TipoDeTabelaCorrecao):
-    logger.info(f"Requisição de buscar última tabela de correção recebida com parâmetro tipo_tabela={tipo_tabela}.")
+    logger.debug("Requisição de buscar última tabela de correção recebida com parâmetro tipo_tabela=%s.",
+                 tipo_tabela.value)
 
     match tipo_tabela:
         # Caso o tipo seja 'selic'
@@ -43,48 +44,37 @@ def get_last_tabela_de_correcao(tipo_tabela: TipoDeTabelaCorrecao):
                 nome_arquivo = TaxaService.get_tabela_de_correcao_selic()
 
                 # Retorna o arquivo gerado como resposta
-                logger.info(f"Requisição processada com sucesso. Será retornado o arquivo: {nome_arquivo}.")
+                logger.info("Requisição processada com sucesso. Será retornado o arquivo: %s.", nome_arquivo)
                 return FileResponse(nome_arquivo, media_type="application/vnd.ms-excel", filename=nome_arquivo)
 
             except requests.RequestException as e:
-                logger.error(f"Erro ao acessar a API externa do BCB: {e}")
+                logger.error("Erro ao acessar a API externa do BCB: %s", e)
                 raise HTTPException(status_code=500, detail="Erro ao acessar a API externa do BCB.")
             except Exception as e:
-                logger.error(f"Erro ao gerar o arquivo Excel: {e}")
+                logger.error("Erro ao gerar o arquivo Excel: %s", e)
                 raise HTTPException(status_code=500, detail="Erro ao gerar o arquivo Excel.")
 
         # Caso o tipo seja 'justica_federal'
         case 'justica_federal':
-            # Inicializa o navegador para automação
-            driver = TaxaService.get_driver()
+            # Reaproveita a tabela já baixada, caso ainda esteja dentro do TTL
+            downloaded_file = TaxaService.get_ultima_tabela_justica_federal()
+            if downloaded_file:
+                nome_arquivo = os.path.basename(downloaded_file)
+                logger.info("Requisição processada com sucesso. Será retornado o arquivo: %s", nome_arquivo)
+                return FileResponse(downloaded_file, media_type="application/vnd.ms-excel", filename=nome_arquivo)
 
             try:
                 # Chama o serviço que faz o download da tabela do site da Justiça Federal
-                downloaded_file = TaxaService.get_tabela_de_correcao_justica_federal(driver)
-
-                if downloaded_file:
-                    logger.info("O arquivo foi baixado com sucesso.")
-                    with open(downloaded_file, "rb") as file:
-                        file_data = file.read()
-
-                    # Retorna o arquivo como resposta
-                    nome_arquivo = os.path.basename(downloaded_file)
-                    logger.info(f"Requisição processada com sucesso. Será retornado o arquivo: {nome_arquivo}")
-                    return Response(
-                        content=file_data,
-                        media_type="application/vnd.ms-excel",
-                        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"}
-                    )
-                else:
-                    logger.error("Erro ao baixar o arquivo da página externa do CJF.")
-                    raise HTTPException(status_code=500,
-                                        detail="Erro ao baixar o arquivo da página externa do CJF.")
-
+                downloaded_file = TaxaService.baixar_tabela_de_correcao_justica_federal()
             except Exception as e:
-                logger.error(f"Erro ao acessar a página externa da CJF: {e}")
+                logger.error("Erro ao acessar a página externa da CJF: %s", e)
                 raise HTTPException(status_code=500, detail="Erro ao acessar a página externa da CJF.")
 
-            finally:
-                # Fecha o navegador após o processo
-                driver.quit()
-                logger.info("Navegador fechado.")
+            if not downloaded_file:
+                logger.error("Erro ao baixar o arquivo da página externa do CJF.")
+                raise HTTPException(status_code=500, detail="Erro ao baixar o arquivo da página externa do CJF.")
+
+            # Retorna o arquivo como resposta
+            nome_arquivo = os.path.basename(downloaded_file)
+            logger.info("Requisição processada com sucesso. Será retornado o arquivo: %s", nome_arquivo)
+            return FileResponse(downloaded_file, media_type="application/vnd.ms-excel", filename=nome_arquivo)
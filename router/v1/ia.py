@@ -12,14 +12,13 @@ from models.calculo import CalculoInput, CalculoOutput
 from models.predicao import PredicaoInput, PredicaoOutput
 from models.resposta import Resposta
 from models.tipoDeTabelaCorrecao import TipoDeTabelaCorrecao
+from service.modelo_compacto import ModeloCompacto
 from service.taxa_service import TaxaService
 
 load_dotenv()
 
 logger = obter_logger_e_configuracao()
 
-BCB_API_URL = os.getenv('BCB_API_URL')
-
 router = APIRouter(
     prefix="/taxa/ai",
     tags=["taxa"]
@@ -32,18 +31,19 @@ router = APIRouter(
     status_code=200
 )
 def create_modelo(tipo_tabela: TipoDeTabelaCorrecao):
-    logger.info(f"Requisição de criar modelo recebida com parâmetro tipo_tabela={tipo_tabela}")
+    logger.debug("Requisição de criar modelo recebida com parâmetro tipo_tabela=%s", tipo_tabela.value)
 
     apk_model = tipo_tabela.value + ".apk"
     match tipo_tabela:
         case 'selic':
-            response = requests.get(BCB_API_URL)
-            if response.status_code != 200:
+            try:
+                dados = TaxaService.get_serie_selic()
+            except requests.RequestException:
                 raise HTTPException(status_code=500, detail="Erro ao acessar a API externa do BCB.")
 
-            TaxaService.create_modelo_selic(response, apk_model)
+            TaxaService.create_modelo_selic(dados, apk_model)
 
-            logger.info(f"Requisição processada com sucesso. Será retornado o arquivo: {apk_model}")
+            logger.info("Requisição processada com sucesso. Será retornado o arquivo: %s", apk_model)
             return FileResponse(apk_model, media_type='application/octet-stream', filename=apk_model)
         case 'justica_federal':
             raise HTTPException(status_code=501,
@@ -58,14 +58,16 @@ def create_modelo(tipo_tabela: TipoDeTabelaCorrecao):
     status_code=200
 )
 def post_modelo(tipo_tabela: TipoDeTabelaCorrecao, file: UploadFile = File(...)) -> Resposta:
-    logger.info(f"Requisição de salvar o modelo recebida com parâmetro tipo_tabela={tipo_tabela}")
+    logger.debug("Requisição de salvar o modelo recebida com parâmetro tipo_tabela=%s", tipo_tabela.value)
     apk_model = tipo_tabela.value + ".apk"
 
     try:
-        with open(apk_model, "wb") as f:
-            f.write(file.file.read())
-        logger.info(f"Requisição processada com sucesso.")
+        ModeloCompacto.salvar_upload(file.file, apk_model)
+        logger.info("Requisição processada com sucesso.")
         return Resposta(mensagem="Modelo carregado com sucesso")
+    except ValueError as e:
+        logger.error("Arquivo de modelo inválido: %s", e)
+        raise HTTPException(status_code=400, detail="Arquivo de modelo inválido.")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Erro ao carregar o arquivo do modelo.")
 
@@ -78,13 +80,13 @@ def post_modelo(tipo_tabela: TipoDeTabelaCorrecao, file: UploadFile = File(...))
     status_code=200
 )
 def delete_modelo(tipo_tabela: TipoDeTabelaCorrecao) -> Resposta:
-    logger.info(f"Requisição de remover o modelo recebida com parâmetro tipo_tabela={tipo_tabela}")
+    logger.debug("Requisição de remover o modelo recebida com parâmetro tipo_tabela=%s", tipo_tabela.value)
     apk_model = tipo_tabela.value + ".apk"
 
     if os.path.exists(apk_model):
         try:
-            os.remove(apk_model)
-            logger.info(f"Requisição processada com sucesso.")
+            ModeloCompacto.remover(apk_model)
+            logger.info("Requisição processada com sucesso.")
             return Resposta(mensagem="Modelo excluído com sucesso")
         except Exception as e:
             raise HTTPException(status_code=500, detail="Erro ao remover o arquivo do modelo.")
@@ -100,15 +102,17 @@ def delete_modelo(tipo_tabela: TipoDeTabelaCorrecao) -> Resposta:
     status_code=200
 )
 def update_modelo(tipo_tabela: TipoDeTabelaCorrecao, file: UploadFile = File(...)) -> Resposta:
-    logger.info(f"Requisição de atualizar o modelo recebida com parâmetro tipo_tabela={tipo_tabela}")
+    logger.debug("Requisição de atualizar o modelo recebida com parâmetro tipo_tabela=%s", tipo_tabela.value)
     apk_model = tipo_tabela.value + ".apk"
 
     if os.path.exists(apk_model):
         try:
-            with open(apk_model, "wb") as f:
-                f.write(file.file.read())
-            logger.info(f"Requisição processada com sucesso.")
+            ModeloCompacto.salvar_upload(file.file, apk_model)
+            logger.info("Requisição processada com sucesso.")
             return Resposta(mensagem="Modelo atualizado com sucesso")
+        except ValueError as e:
+            logger.error("Arquivo de modelo inválido: %s", e)
+            raise HTTPException(status_code=400, detail="Arquivo de modelo inválido.")
         except Exception as e:
             raise HTTPException(status_code=500, detail="Erro ao atualizar o arquivo do modelo.")
     else:
@@ -122,14 +126,12 @@ def update_modelo(tipo_tabela: TipoDeTabelaCorrecao, file: UploadFile = File(...
     status_code=200
 )
 def get_modelo(tipo_tabela: TipoDeTabelaCorrecao):
-    logger.info(f"Requisição de buscar o modelo recebida com parâmetro tipo_tabela={tipo_tabela}")
+    logger.debug("Requisição de buscar o modelo recebida com parâmetro tipo_tabela=%s", tipo_tabela.value)
     apk_model = tipo_tabela.value + ".apk"
 
     if os.path.exists(apk_model):
         try:
-            with open(apk_model, "rb") as f:
-                file_content = f.read()
-            logger.info(f"Requisição processada com sucesso. Será retornado o arquivo: {apk_model}")
+            logger.info("Requisição processada com sucesso. Será retornado o arquivo: %s", apk_model)
             return FileResponse(apk_model, media_type='application/octet-stream', filename=apk_model)
         except Exception as e:
             raise HTTPException(status_code=500, detail="Erro ao buscar o arquivo do modelo.")
@@ -145,8 +147,8 @@ def get_modelo(tipo_tabela: TipoDeTabelaCorrecao):
     status_code=200
 )
 def post_predicao(predicaoInput: PredicaoInput) -> PredicaoOutput:
-    logger.info(f"Requisição de predição recebida com parâmetros ano={predicaoInput.ano}, mes={predicaoInput.mes}, "
-                f"tipo_tabela={predicaoInput.tipo_tabela}")
+    logger.debug("Requisição de predição recebida com parâmetros ano=%s, mes=%s, tipo_tabela=%s",
+                 predicaoInput.ano, predicaoInput.mes, predicaoInput.tipo_tabela.value)
 
     # Obtém o ano e mês atuais
     data_atual = datetime.datetime.now()
@@ -166,7 +168,7 @@ def post_predicao(predicaoInput: PredicaoInput) -> PredicaoOutput:
     match predicaoInput.tipo_tabela:
         case 'selic':
             valor_previsto = TaxaService.get_predicao_selic(apk_model, predicaoInput)
-            logger.info(f"Requisição processada com sucesso.")
+            logger.info("Requisição processada com sucesso.")
             return PredicaoOutput(ano=predicaoInput.ano, mes=predicaoInput.mes, valor_previsto=valor_previsto)
         case 'justica_federal':
             raise HTTPException(status_code=501, detail="Predição com o modelo ainda não foi implementada.")
@@ -180,10 +182,10 @@ def post_predicao(predicaoInput: PredicaoInput) -> PredicaoOutput:
     status_code=200
 )
 def post_calculo(calculoInput: CalculoInput) -> CalculoOutput:
-    logger.info(f"Requisição de cálculo recebida com parâmetros referencia_ano={calculoInput.referencia_ano}, "
-                f"referencia_mes={calculoInput.referencia_mes}, predicao_ano={calculoInput.predicao_ano}, "
-                f"predicao_mes={calculoInput.predicao_mes}, tipo_tabela={calculoInput.tipo_tabela},"
-                f"valor={calculoInput.valor}")
+    logger.debug("Requisição de cálculo recebida com parâmetros referencia_ano=%s, referencia_mes=%s, "
+                 "predicao_ano=%s, predicao_mes=%s, tipo_tabela=%s, valor=%s",
+                 calculoInput.referencia_ano, calculoInput.referencia_mes, calculoInput.predicao_ano,
+                 calculoInput.predicao_mes, calculoInput.tipo_tabela.value, calculoInput.valor)
     if calculoInput.valor <= 0:
         logger.error("Erro ao calcular: Não é permitido calcular um valor negativo ou igual a zero.")
         raise HTTPException(status_code=400, detail="Não é permitido calcular um valor negativoou igual a zero.")
@@ -215,13 +217,14 @@ def post_calculo(calculoInput: CalculoInput) -> CalculoOutput:
 
     match calculoInput.tipo_tabela:
         case 'selic':
-            response = requests.get(BCB_API_URL)
-            if response.status_code != 200:
+            try:
+                dados = TaxaService.get_serie_selic()
+            except requests.RequestException:
                 logger.error("Erro ao calcular: Erro ao acessar a API externa do BCB.")
                 raise HTTPException(status_code=500, detail="Erro ao acessar a API externa do BCB.")
-            taxa, valor_previsto = TaxaService.get_calculo_selic(apk_model, calculoInput, response)
+            taxa, valor_previsto = TaxaService.get_calculo_selic(apk_model, calculoInput, dados)
 
-            logger.info(f"Requisição processada com sucesso.")
+            logger.info("Requisição processada com sucesso.")
             return CalculoOutput(ano=calculoInput.referencia_ano, mes=calculoInput.referencia_mes,
                                  taxa=taxa, valor_previsto=valor_previsto)
         case 'justica_federal':
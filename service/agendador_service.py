@@ -0,0 +1,232 @@
+import asyncio
+import datetime
+import os
+import random
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from config.loggger import obter_logger_e_configuracao, request_id_atual
+from service.modelo_compacto import ModeloCompacto
+from service.taxa_service import (TaxaService, DRIVER_PATH, DOWNLOAD_PATH, SERIE_SELIC_ARQUIVO,
+                                  TABELA_SELIC_ARQUIVO, ARTEFATOS_AGENDADOS)
+
+try:
+    import fcntl
+except ImportError:
+    # No Windows as travas de arquivo são feitas com o msvcrt
+    fcntl = None
+    import msvcrt
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Obtém o logger para registrar mensagens
+logger = obter_logger_e_configuracao()
+
+# Configuração do agendador obtida das variáveis de ambiente
+AGENDADOR_ATIVO = os.getenv("AGENDADOR_ATIVO", "true").lower() == "true"
+AGENDADOR_RETREINAR_MODELO = os.getenv("AGENDADOR_RETREINAR_MODELO", "true").lower() == "true"
+
+# Agendas no formato "minuto hora dia_do_mês", aceitando '*', listas (1,15) e intervalos (1-5).
+# A SELIC mensal do BCB e a tabela do CJF são publicadas nos primeiros dias úteis do mês.
+AGENDA_SELIC = os.getenv("AGENDA_SELIC", "0 7,13 1-7")
+AGENDA_CJF = os.getenv("AGENDA_CJF", "30 7 1-10")
+
+# Novas tentativas com backoff exponencial e jitter em caso de falha
+AGENDADOR_TENTATIVAS = int(os.getenv("AGENDADOR_TENTATIVAS", "5"))
+AGENDADOR_BACKOFF_S = float(os.getenv("AGENDADOR_BACKOFF_S", "30"))
+AGENDADOR_BACKOFF_MAX_S = float(os.getenv("AGENDADOR_BACKOFF_MAX_S", "1800"))
+
+# Nome do arquivo do modelo da SELIC, igual ao usado pelas rotas
+APK_MODEL_SELIC = "selic.apk"
+
+
+# Converte um campo da agenda em um conjunto ordenado de valores permitidos
+def interpretar_campo(campo, minimo, maximo):
+    if campo == "*":
+        return list(range(minimo, maximo + 1))
+
+    valores = set()
+    for parte in campo.split(","):
+        if "-" in parte:
+            inicio, fim = parte.split("-")
+            valores.update(range(int(inicio), int(fim) + 1))
+        else:
+            valores.add(int(parte))
+
+    if not valores or min(valores) < minimo or max(valores) > maximo:
+        raise ValueError(f"Campo de agenda inválido: {campo}")
+    return sorted(valores)
+
+
+# Percorre os horários da agenda a partir de 'agora', para frente ou para trás no tempo
+def horarios_da_agenda(agenda, agora, para_tras=False):
+    campo_minuto, campo_hora, campo_dia = agenda.split()
+    minutos = interpretar_campo(campo_minuto, 0, 59)
+    horas = interpretar_campo(campo_hora, 0, 23)
+    dias = interpretar_campo(campo_dia, 1, 31)
+    passo = datetime.timedelta(days=-1 if para_tras else 1)
+
+    data = agora.date()
+    for _ in range(366):
+        if data.day in dias:
+            horarios = [datetime.datetime.combine(data, datetime.time(hora, minuto))
+                        for hora in horas for minuto in minutos]
+            yield from reversed(horarios) if para_tras else horarios
+        data += passo
+
+    raise ValueError(f"Agenda sem horários válidos: {agenda}")
+
+
+# Calcula o próximo horário, posterior a 'agora', que satisfaz a agenda
+def proximo_horario(agenda, agora):
+    return next(horario for horario in horarios_da_agenda(agenda, agora) if horario > agora)
+
+
+# Calcula o último horário da agenda já alcançado em 'agora'
+def horario_anterior(agenda, agora):
+    return next(horario for horario in horarios_da_agenda(agenda, agora, para_tras=True) if horario <= agora)
+
+
+# Indica se o arquivo não existe ou foi publicado antes do horário informado
+def desatualizado(caminho, desde):
+    if not caminho:
+        return True
+    try:
+        return datetime.datetime.fromtimestamp(os.path.getmtime(caminho)) < desde
+    except FileNotFoundError:
+        return True
+
+
+# Tenta obter, sem bloquear, uma trava exclusiva entre processos; retorna se ela foi obtida
+@contextmanager
+def trava_exclusiva(caminho):
+    with open(caminho, "a+b") as f:
+        try:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class AgendadorService:
+
+    def __init__(self):
+        self.tarefas = []
+
+    # Indica se algum artefato da SELIC foi publicado antes do horário informado
+    @staticmethod
+    def selic_desatualizada(desde):
+        artefatos = [SERIE_SELIC_ARQUIVO, TABELA_SELIC_ARQUIVO]
+        if AGENDADOR_RETREINAR_MODELO:
+            artefatos.append(APK_MODEL_SELIC)
+        return any(desatualizado(artefato, desde) for artefato in artefatos)
+
+    # Atualiza a série da SELIC e publica a tabela de correção e o modelo treinado a partir dela
+    @staticmethod
+    def atualizar_selic(desde):
+        dados = TaxaService.get_serie_selic(forcar=True)
+        TaxaService.create_tabela_de_correcao_selic(dados)
+
+        # Um modelo publicado depois do horário agendado, por exemplo enviado pelas rotas, é mantido
+        if AGENDADOR_RETREINAR_MODELO and desatualizado(APK_MODEL_SELIC, desde):
+            TaxaService.create_modelo_selic(dados, APK_MODEL_SELIC)
+
+        # Deixa o modelo carregado no cache deste processo
+        if os.path.exists(APK_MODEL_SELIC):
+            ModeloCompacto.carregar(APK_MODEL_SELIC)
+
+    # Indica se a tabela da Justiça Federal foi publicada antes do horário informado
+    @staticmethod
+    def justica_federal_desatualizada(desde):
+        return desatualizado(TaxaService.get_ultimo_arquivo_xls(DOWNLOAD_PATH), desde)
+
+    # Baixa a tabela de correção monetária mais recente do site da Justiça Federal
+    @staticmethod
+    def atualizar_justica_federal(desde):
+        if not TaxaService.baixar_tabela_de_correcao_justica_federal():
+            raise RuntimeError("Nenhum arquivo foi baixado da página externa do CJF.")
+
+    # Inicia uma tarefa em segundo plano para cada artefato a ser mantido atualizado
+    def iniciar(self):
+        if not AGENDADOR_ATIVO:
+            logger.info("Agendador desativado.")
+            return
+
+        jobs = [("selic", AGENDA_SELIC, self.selic_desatualizada, self.atualizar_selic)]
+        if DRIVER_PATH:
+            jobs.append(("justica_federal", AGENDA_CJF, self.justica_federal_desatualizada,
+                         self.atualizar_justica_federal))
+        else:
+            logger.info("DRIVER_PATH não configurado. A tabela da Justiça Federal não será pré-carregada.")
+
+        for nome, agenda, verificar, funcao in jobs:
+            # Valida a agenda antes de iniciar a tarefa
+            proximo_horario(agenda, datetime.datetime.now())
+            ARTEFATOS_AGENDADOS.add(nome)
+            self.tarefas.append(asyncio.create_task(self.executar(nome, agenda, verificar, funcao)))
+
+    # Cancela as tarefas em andamento
+    async def parar(self):
+        for tarefa in self.tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self.tarefas, return_exceptions=True)
+        self.tarefas = []
+        ARTEFATOS_AGENDADOS.clear()
+
+    # Executa a atualização na inicialização, caso os artefatos estejam desatualizados, e depois a cada horário da agenda
+    async def executar(self, nome, agenda, verificar, funcao):
+        request_id_atual.set(f"agendador-{nome}")
+        caminho_trava = os.path.join(DOWNLOAD_PATH, f".agendador-{nome}.lock")
+
+        while True:
+            # Um erro inesperado não pode encerrar a tarefa, o que interromperia as próximas atualizações
+            try:
+                desde = horario_anterior(agenda, datetime.datetime.now())
+
+                # Apenas um processo atualiza cada artefato. Os demais encontram a trava ocupada ou,
+                # ao obtê-la depois, verificam que a atualização já foi publicada.
+                with trava_exclusiva(caminho_trava) as obtida:
+                    if not obtida:
+                        logger.info("Atualização de %s em andamento em outro processo.", nome)
+                    elif not verificar(desde):
+                        logger.info("Artefatos de %s já atualizados desde %s.", nome, desde.isoformat())
+                    else:
+                        await self.executar_com_tentativas(nome, lambda: funcao(desde))
+            except Exception:
+                logger.exception("Erro inesperado na atualização de %s.", nome)
+
+            agora = datetime.datetime.now()
+            proximo = proximo_horario(agenda, agora)
+            logger.info("Próxima atualização de %s agendada para %s.", nome, proximo.isoformat())
+            await asyncio.sleep((proximo - agora).total_seconds())
+
+    # Executa a atualização em uma thread, repetindo com backoff exponencial e jitter em caso de falha
+    async def executar_com_tentativas(self, nome, funcao):
+        for tentativa in range(1, AGENDADOR_TENTATIVAS + 1):
+            try:
+                await asyncio.to_thread(funcao)
+                logger.info("Atualização de %s concluída com sucesso.", nome)
+                return
+            except Exception as e:
+                if tentativa == AGENDADOR_TENTATIVAS:
+                    logger.error("Atualização de %s falhou após %s tentativas: %s", nome, tentativa, e)
+                    return
+
+                espera = random.uniform(0, min(AGENDADOR_BACKOFF_MAX_S, AGENDADOR_BACKOFF_S * 2 ** tentativa))
+                logger.warning("Falha na tentativa %s de atualização de %s: %s. Nova tentativa em %.0f s.",
+                               tentativa, nome, e, espera)
+                await asyncio.sleep(espera)
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+# Permissões dos arquivos publicados, iguais às de um arquivo criado normalmente (respeitando o umask).
+# O umask só pode ser lido alterando-o, o que é feito uma única vez na importação do módulo.
+_umask = os.umask(0)
+os.umask(_umask)
+MODO_ARQUIVO = 0o666 & ~_umask
+
+
+# Escreve em um arquivo temporário e o substitui atomicamente, sem afetar leitores do arquivo anterior.
+# Se informada, a função 'validar' recebe o caminho do arquivo temporário antes da substituição.
+def publicar(destino, escrever, validar=None):
+    diretorio = os.path.dirname(os.path.abspath(destino))
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            escrever(f)
+        # O mkstemp cria o arquivo com permissão 0600, que seria mantida após a substituição
+        os.chmod(temporario, MODO_ARQUIVO)
+        if validar:
+            validar(temporario)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.remove(temporario)
+        raise
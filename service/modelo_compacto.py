@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+from service.arquivos import publicar
+
+# Estrutura de cada nó da árvore exportada para arrays planos do NumPy
+NO_DTYPE = np.dtype([
+    ("esquerda", np.int32),
+    ("direita", np.int32),
+    ("atributo", np.int32),
+    ("limiar", np.float64),
+    ("valor", np.float64),
+])
+
+# Assinatura inicial de arquivos .npy, usada para distinguir do formato joblib legado
+NPY_MAGIC = npy_format.MAGIC_PREFIX
+
+# Tamanho dos blocos usados para copiar arquivos de modelo (1 MiB)
+CHUNK_SIZE = 1024 * 1024
+
+# Cache dos modelos carregados por processo, indexado pelo caminho do arquivo
+_modelos_carregados = {}
+
+# No Windows um arquivo mapeado em memória não pode ser substituído nem removido, inclusive
+# por outros processos, então o modelo é lido para a memória em vez de mapeado
+MMAP_MODE = None if os.name == "nt" else "r"
+
+
+class ArvoreCompacta:
+
+    def __init__(self, nos):
+        self.nos = nos
+
+    # Realiza a previsão percorrendo a árvore de forma vetorizada para todas as entradas
+    def predict(self, X):
+        # Mesma conversão para float32 feita pelo DecisionTreeRegressor antes de comparar com os limiares
+        X = np.asarray(X, dtype=np.float32)
+        esquerda = self.nos["esquerda"]
+        direita = self.nos["direita"]
+        atributo = self.nos["atributo"]
+        limiar = self.nos["limiar"]
+
+        linhas = np.arange(len(X))
+        no = np.zeros(len(X), dtype=np.int64)
+        ativos = esquerda[no] != -1
+        while ativos.any():
+            atual = no[ativos]
+            vai_esquerda = X[linhas[ativos], atributo[atual]] <= limiar[atual]
+            no[ativos] = np.where(vai_esquerda, esquerda[atual], direita[atual])
+            ativos = esquerda[no] != -1
+
+        return np.asarray(self.nos["valor"][no])
+
+
+class ModeloCompacto:
+
+    # Exporta a árvore treinada para arrays planos e salva o arquivo de forma atômica
+    @staticmethod
+    def salvar(model, apk_model, X):
+        tree = model.tree_
+        nos = np.empty(tree.node_count, dtype=NO_DTYPE)
+        nos["esquerda"] = tree.children_left
+        nos["direita"] = tree.children_right
+        nos["atributo"] = tree.feature
+        nos["limiar"] = tree.threshold
+        nos["valor"] = tree.value.reshape(tree.node_count, -1)[:, 0]
+
+        # Garante que a árvore exportada reproduz as previsões do modelo original
+        if not np.array_equal(ArvoreCompacta(nos).predict(X), model.predict(X)):
+            raise ValueError("A árvore exportada diverge das previsões do modelo treinado.")
+
+        ModeloCompacto.publicar(apk_model, lambda f: np.save(f, nos, allow_pickle=False))
+
+    # Carrega o modelo via memory mapping, reaproveitando a instância enquanto o arquivo não mudar
+    @staticmethod
+    def carregar(apk_model):
+        st = os.stat(apk_model)
+        versao = (st.st_ino, st.st_mtime_ns, st.st_size)
+        em_cache = _modelos_carregados.get(apk_model)
+        if em_cache is not None and em_cache[0] == versao:
+            return em_cache[1]
+
+        with open(apk_model, "rb") as f:
+            compacto = f.read(len(NPY_MAGIC)) == NPY_MAGIC
+
+        if compacto:
+            model = ArvoreCompacta(np.load(apk_model, mmap_mode=MMAP_MODE, allow_pickle=False))
+        else:
+            # Modelos no formato joblib legado continuam sendo aceitos
+            import joblib
+            model = joblib.load(apk_model)
+
+        _modelos_carregados[apk_model] = (versao, model)
+        return model
+
+    # Descarta o modelo em cache, liberando o mapeamento do arquivo antes de substituí-lo ou removê-lo
+    @staticmethod
+    def descartar(apk_model):
+        _modelos_carregados.pop(apk_model, None)
+
+    # Remove o arquivo do modelo
+    @staticmethod
+    def remover(apk_model):
+        ModeloCompacto.descartar(apk_model)
+        os.remove(apk_model)
+
+    # Copia em blocos o conteúdo enviado para o arquivo do modelo, publicando-o apenas se for um modelo válido
+    @staticmethod
+    def salvar_upload(arquivo, apk_model):
+        def copiar(f):
+            while bloco := arquivo.read(CHUNK_SIZE):
+                f.write(bloco)
+
+        ModeloCompacto.publicar(apk_model, copiar, validar=ModeloCompacto.validar)
+
+    # Verifica se o arquivo contém um modelo utilizável, levantando ValueError caso contrário
+    @staticmethod
+    def validar(caminho):
+        with open(caminho, "rb") as f:
+            compacto = f.read(len(NPY_MAGIC)) == NPY_MAGIC
+
+        if compacto:
+            try:
+                nos = np.load(caminho, mmap_mode=MMAP_MODE, allow_pickle=False)
+            except Exception as e:
+                raise ValueError(f"Arquivo .npy inválido: {e}")
+            if nos.dtype != NO_DTYPE or nos.ndim != 1 or len(nos) == 0:
+                raise ValueError("O arquivo não contém uma árvore no formato compacto.")
+            filhos = np.concatenate([nos["esquerda"], nos["direita"]])
+            if filhos.min() < -1 or filhos.max() >= len(nos):
+                raise ValueError("A árvore do arquivo referencia nós inexistentes.")
+            return
+
+        # Modelos no formato joblib legado precisam ao menos oferecer o método predict
+        import joblib
+        try:
+            model = joblib.load(caminho)
+        except Exception as e:
+            raise ValueError(f"Arquivo joblib inválido: {e}")
+        if not callable(getattr(model, "predict", None)):
+            raise ValueError("O arquivo joblib não contém um modelo com o método predict.")
+
+    # Publica o arquivo do modelo de forma atômica, descartando o modelo em cache antes da substituição
+    @staticmethod
+    def publicar(apk_model, escrever, validar=None):
+        def preparar(temporario):
+            if validar:
+                validar(temporario)
+            ModeloCompacto.descartar(apk_model)
+
+        publicar(apk_model, escrever, validar=preparar)
@@ -1,7 +1,9 @@
+import json
 import os
+import shutil
+import tempfile
 import time
 
-import joblib
 import pandas as pd
 import requests
 from dotenv import load_dotenv
@@ -10,10 +12,11 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import Select, WebDriverWait
-from sklearn.model_selection import train_test_split
-from sklearn.tree import DecisionTreeRegressor
 
 from config.loggger import obter_logger_e_configuracao
+from config.rastreamento import span
+from service.arquivos import publicar
+from service.modelo_compacto import ModeloCompacto
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -27,22 +30,89 @@ CJF_URL = os.getenv('CJF_URL')
 DRIVER_PATH = os.getenv('DRIVER_PATH')
 DOWNLOAD_PATH = os.getcwd()  # Diretório atual como pasta de download
 
+# Arquivos publicados com a série da SELIC e a tabela de correção gerada a partir dela
+SERIE_SELIC_ARQUIVO = "selic.json"
+TABELA_SELIC_ARQUIVO = "selic.xlsx"
+
+# Tempo máximo, em horas, para reaproveitar a série da SELIC e a tabela da Justiça Federal já publicadas
+# quando nenhuma tarefa do agendador as mantém atualizadas (0 não expira)
+SERIE_SELIC_TTL_HORAS = float(os.getenv("SERIE_SELIC_TTL_HORAS", "24"))
+TABELA_CJF_TTL_HORAS = float(os.getenv("TABELA_CJF_TTL_HORAS", "24"))
+
+# Tempo máximo, em segundos, de espera pela API do BCB e pelo download da tabela da Justiça Federal
+BCB_TIMEOUT_S = float(os.getenv("BCB_TIMEOUT_S", "30"))
+CJF_DOWNLOAD_TIMEOUT_S = float(os.getenv("CJF_DOWNLOAD_TIMEOUT_S", "30"))
+
+# Artefatos ("selic", "justica_federal") mantidos por uma tarefa do agendador em execução neste processo.
+# Para eles, a última versão publicada é sempre reaproveitada, pois o agendador decide quando atualizá-la.
+ARTEFATOS_AGENDADOS = set()
+
+
+# Indica se um arquivo publicado ainda pode ser reaproveitado, dado o TTL em horas (0 não expira)
+def dentro_do_ttl(caminho, ttl_horas, artefato):
+    if artefato in ARTEFATOS_AGENDADOS or ttl_horas <= 0:
+        return True
+    return time.time() - os.path.getmtime(caminho) < ttl_horas * 3600
+
+# Última série da SELIC lida do disco por este processo, na forma (mtime, dados)
+_serie_selic_em_cache = None
+
 class TaxaService:
 
+    # Obtém a série histórica da SELIC, reaproveitando a última versão publicada enquanto estiver dentro do TTL
+    @staticmethod
+    def get_serie_selic(forcar=False):
+        publicada = os.path.exists(SERIE_SELIC_ARQUIVO)
+        if not forcar and publicada and dentro_do_ttl(SERIE_SELIC_ARQUIVO, SERIE_SELIC_TTL_HORAS, "selic"):
+            return TaxaService.get_serie_selic_publicada()
+
+        # Faz requisição à API do Banco Central
+        try:
+            with span("bcb_fetch"):
+                response = requests.get(BCB_API_URL, timeout=BCB_TIMEOUT_S)
+                response.raise_for_status()
+                dados = response.json()
+        except requests.RequestException as e:
+            # Sem atualização forçada, uma versão anterior ainda é preferível a um erro
+            if forcar or not publicada:
+                raise
+            logger.warning("Erro ao acessar a API externa do BCB: %s. Será usada a última série publicada.", e)
+            return TaxaService.get_serie_selic_publicada()
+
+        # Publica a nova versão da série de forma atômica
+        conteudo = json.dumps(dados).encode("utf-8")
+        publicar(SERIE_SELIC_ARQUIVO, lambda f: f.write(conteudo))
+        return dados
+
+    # Lê a última série da SELIC publicada, reaproveitando a leitura enquanto o arquivo não mudar
+    @staticmethod
+    def get_serie_selic_publicada():
+        global _serie_selic_em_cache
+
+        mtime = os.stat(SERIE_SELIC_ARQUIVO).st_mtime_ns
+        if _serie_selic_em_cache is None or _serie_selic_em_cache[0] != mtime:
+            with open(SERIE_SELIC_ARQUIVO, "rb") as f:
+                _serie_selic_em_cache = (mtime, json.load(f))
+        return _serie_selic_em_cache[1]
+
     # Cria e treina um modelo de regressão com as taxas da SELIC
     @staticmethod
-    def create_modelo_selic(response, apk_model):
-        data = response.json()
-        df = pd.DataFrame(data)
-
-        # Filtra os dados
-        df["data"] = pd.to_datetime(df["data"], format="%d/%m/%Y")
-        df["valor"] = pd.to_numeric(df["valor"], errors="coerce")
-        df.dropna(inplace=True)
-
-        # Cria as colunas de mês e ano a partir da data
-        df["mes"] = df["data"].dt.month
-        df["ano"] = df["data"].dt.year
+    def create_modelo_selic(dados, apk_model):
+        # Importado apenas no treino, para que os workers que só fazem previsões não carreguem o sklearn
+        from sklearn.model_selection import train_test_split
+        from sklearn.tree import DecisionTreeRegressor
+
+        with span("parse"):
+            df = pd.DataFrame(dados)
+
+            # Filtra os dados
+            df["data"] = pd.to_datetime(df["data"], format="%d/%m/%Y")
+            df["valor"] = pd.to_numeric(df["valor"], errors="coerce")
+            df.dropna(inplace=True)
+
+            # Cria as colunas de mês e ano a partir da data
+            df["mes"] = df["data"].dt.month
+            df["ano"] = df["data"].dt.year
         X = df[["ano", "mes"]]
         y = df["valor"]
 
@@ -53,40 +123,45 @@ class TaxaService:
         model = DecisionTreeRegressor()
 
         # Treina o modelo
-        model.fit(X_train, y_train)
+        with span("fit"):
+            model.fit(X_train, y_train)
         logger.info("O modelo foi treinado com sucesso.")
 
-        # Salva o modelo treinado em um arquivo
-        joblib.dump(model, apk_model)
+        # Salva o modelo treinado em um arquivo compacto
+        with span("model_save"):
+            ModeloCompacto.salvar(model, apk_model, X)
 
     # Realiza uma previsão da taxa SELIC para uma determinada entrada de ano e mês
     @staticmethod
     def get_predicao_selic(apk_model, predicaoInput):
         # Carrega o modelo salvo
-        model = joblib.load(apk_model)
+        with span("model_load"):
+            model = ModeloCompacto.carregar(apk_model)
 
         # Cria um DataFrame para a entrada de previsão
         input_data = pd.DataFrame([[predicaoInput.ano, predicaoInput.mes]], columns=["ano", "mes"])
 
         # Faz a previsão
-        valor_previsto = model.predict(input_data)[0]
+        with span("predict"):
+            valor_previsto = model.predict(input_data)[0]
         return valor_previsto
 
     # Calcula os valores acumulados da SELIC para um intervalo de tempo específico
     @staticmethod
-    def get_calculo_selic(apk_model, calculoInput, response):
-        data = response.json()
-        df = pd.DataFrame(data)
+    def get_calculo_selic(apk_model, calculoInput, dados):
+        with span("parse"):
+            df = pd.DataFrame(dados)
 
-        # Filtra os dados
-        df["data"] = pd.to_datetime(df["data"], format="%d/%m/%Y")
-        df["valor"] = pd.to_numeric(df["valor"], errors="coerce")
-        df.dropna(inplace=True)
-        df["mes"] = df["data"].dt.month
-        df["ano"] = df["data"].dt.year
+            # Filtra os dados
+            df["data"] = pd.to_datetime(df["data"], format="%d/%m/%Y")
+            df["valor"] = pd.to_numeric(df["valor"], errors="coerce")
+            df.dropna(inplace=True)
+            df["mes"] = df["data"].dt.month
+            df["ano"] = df["data"].dt.year
 
         # Carrega o modelo salvo
-        model = joblib.load(apk_model)
+        with span("model_load"):
+            model = ModeloCompacto.carregar(apk_model)
 
         # Determina a última data presente no dataset
         last_date = df["data"].max()
@@ -99,26 +174,28 @@ class TaxaService:
         predictions = []
 
         # Para cada data gerada, faz a previsão do valor
-        for date in pred_dates:
-            input_data = pd.DataFrame([[date.year, date.month]], columns=["ano", "mes"])
-            predicted_value = model.predict(input_data)[0]
-            predictions.append((date, predicted_value))
-
-        # Atualiza o DataFrame com os valores previstos
-        for date, value in predictions:
-            df = pd.concat(
-                [df, pd.DataFrame({"data": [date], "valor": [value], "ano": [date.year], "mes": [date.month]})])
-
-        # Ordena os dados
-        df = df.sort_values(by="data", ascending=False).reset_index(drop=True)
-
-        # Substitui o primeiro valor por 1
-        if not df.empty:
-            df.at[0, "valor"] = 1
-
-        # Calcula os valores cumulativos
-        for i in range(1, len(df)):
-            df.at[i, "valor"] = df.at[i - 1, "valor"] + df.at[i, "valor"] * 0.01
+        with span("predict"):
+            for date in pred_dates:
+                input_data = pd.DataFrame([[date.year, date.month]], columns=["ano", "mes"])
+                predicted_value = model.predict(input_data)[0]
+                predictions.append((date, predicted_value))
+
+        with span("accumulate"):
+            # Atualiza o DataFrame com os valores previstos
+            for date, value in predictions:
+                df = pd.concat(
+                    [df, pd.DataFrame({"data": [date], "valor": [value], "ano": [date.year], "mes": [date.month]})])
+
+            # Ordena os dados
+            df = df.sort_values(by="data", ascending=False).reset_index(drop=True)
+
+            # Substitui o primeiro valor por 1
+            if not df.empty:
+                df.at[0, "valor"] = 1
+
+            # Calcula os valores cumulativos
+            for i in range(1, len(df)):
+                df.at[i, "valor"] = df.at[i - 1, "valor"] + df.at[i, "valor"] * 0.01
         reference_date = pd.Timestamp(year=calculoInput.referencia_ano, month=calculoInput.referencia_mes, day=1)
 
         # Obtém a taxa correspondente à referência
@@ -128,49 +205,108 @@ class TaxaService:
         valor_previsto = calculoInput.valor * taxa
         return taxa, valor_previsto
 
-    # Gera uma tabela de correção monetária com base nos dados da SELIC
+    # Obtém a tabela de correção monetária da SELIC, gerando-a apenas quando a série for mais recente que o arquivo
     @staticmethod
     def get_tabela_de_correcao_selic():
+        dados = TaxaService.get_serie_selic()
 
-        # Faz requisição à API do Banco Central
-        response = requests.get(BCB_API_URL)
-        response.raise_for_status()
-        dados = response.json()
-
-        df = pd.DataFrame(dados)
-        df.columns = ["Data", "Valor"]
-        df["Data"] = pd.to_datetime(df["Data"], format="%d/%m/%Y")
-        df["Valor"] = pd.to_numeric(df["Valor"], errors="coerce")
-
-        # Ordena os dados
-        df = df.sort_values(by="Data", ascending=False).reset_index(drop=True)
-
-        # Substitui o primeiro valor por 1
-        if not df.empty:
-            df.at[0, "Valor"] = 1
-
-        # Calcula os valores acumulativos
-        for i in range(1, len(df)):
-            df.at[i, "Valor"] = df.at[i - 1, "Valor"] + df.at[i, "Valor"] * 0.01
-        df["Ano"] = df["Data"].dt.year
-        df["Mês"] = df["Data"].dt.month_name(locale='pt_BR')
-
-        # Cria uma tabela dinâmica
-        df_pivot = df.pivot(index="Ano", columns="Mês", values="Valor")
-        meses_ordenados = [
-            "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-            "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
-        ]
-        df_pivot = df_pivot.reindex(columns=meses_ordenados)
-
-        nome_arquivo = "selic.xlsx"
-        df_pivot.to_excel(nome_arquivo)
+        if (os.path.exists(TABELA_SELIC_ARQUIVO) and
+                os.path.getmtime(TABELA_SELIC_ARQUIVO) >= os.path.getmtime(SERIE_SELIC_ARQUIVO)):
+            return TABELA_SELIC_ARQUIVO
+
+        return TaxaService.create_tabela_de_correcao_selic(dados)
+
+    # Gera uma tabela de correção monetária com base nos dados da SELIC
+    @staticmethod
+    def create_tabela_de_correcao_selic(dados):
+        with span("parse"):
+            df = pd.DataFrame(dados)
+            df.columns = ["Data", "Valor"]
+            df["Data"] = pd.to_datetime(df["Data"], format="%d/%m/%Y")
+            df["Valor"] = pd.to_numeric(df["Valor"], errors="coerce")
+
+        with span("accumulate"):
+            # Ordena os dados
+            df = df.sort_values(by="Data", ascending=False).reset_index(drop=True)
+
+            # Substitui o primeiro valor por 1
+            if not df.empty:
+                df.at[0, "Valor"] = 1
+
+            # Calcula os valores acumulativos
+            for i in range(1, len(df)):
+                df.at[i, "Valor"] = df.at[i - 1, "Valor"] + df.at[i, "Valor"] * 0.01
+
+        with span("render"):
+            df["Ano"] = df["Data"].dt.year
+            df["Mês"] = df["Data"].dt.month_name(locale='pt_BR')
+
+            # Cria uma tabela dinâmica
+            df_pivot = df.pivot(index="Ano", columns="Mês", values="Valor")
+            meses_ordenados = [
+                "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+                "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
+            ]
+            df_pivot = df_pivot.reindex(columns=meses_ordenados)
+
+            # Publica a tabela de forma atômica
+            nome_arquivo = TABELA_SELIC_ARQUIVO
+            publicar(nome_arquivo, lambda f: df_pivot.to_excel(f, engine="openpyxl"))
 
         return nome_arquivo
 
+    # Retorna a tabela da Justiça Federal baixada mais recentemente, caso ainda esteja dentro do TTL
+    @staticmethod
+    def get_ultima_tabela_justica_federal():
+        downloaded_file = TaxaService.get_ultimo_arquivo_xls(DOWNLOAD_PATH)
+        if downloaded_file and dentro_do_ttl(downloaded_file, TABELA_CJF_TTL_HORAS, "justica_federal"):
+            return downloaded_file
+        return None
+
+    # Localiza o arquivo .xls mais recente no diretório informado
+    @staticmethod
+    def get_ultimo_arquivo_xls(diretorio):
+        downloaded_file = None
+        latest_time = 0
+
+        for file in os.listdir(diretorio):
+            file_path = os.path.join(diretorio, file)
+            if file.endswith(".xls") and os.path.isfile(file_path):
+                file_mod_time = os.path.getmtime(file_path)
+                if file_mod_time > latest_time:
+                    latest_time = file_mod_time
+                    downloaded_file = file_path
+
+        return downloaded_file
+
+    # Baixa a tabela da Justiça Federal em um diretório temporário e a publica de forma atômica no diretório de download
+    @staticmethod
+    def baixar_tabela_de_correcao_justica_federal():
+        # Cada execução usa seu próprio diretório, para que só conte como sucesso um arquivo baixado por ela
+        diretorio = tempfile.mkdtemp(dir=DOWNLOAD_PATH, prefix=".cjf-")
+        try:
+            driver = TaxaService.get_driver(diretorio)
+            try:
+                with span("cjf_fetch"):
+                    arquivo_baixado = TaxaService.get_tabela_de_correcao_justica_federal(driver, diretorio)
+            finally:
+                # Fecha o navegador após o processo
+                driver.quit()
+                logger.info("Navegador fechado.")
+
+            if not arquivo_baixado:
+                return None
+
+            downloaded_file = os.path.join(DOWNLOAD_PATH, os.path.basename(arquivo_baixado))
+            os.replace(arquivo_baixado, downloaded_file)
+            logger.info("O arquivo foi baixado com sucesso.")
+            return downloaded_file
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
     # Obtém a tabela de correção monetária do site da Justiça Federal
     @staticmethod
-    def get_tabela_de_correcao_justica_federal(driver):
+    def get_tabela_de_correcao_justica_federal(driver, diretorio):
         logger.info("Navegador aberto em modo headless.")
 
         # Abre a URL da Justiça Federal
@@ -218,30 +354,26 @@ class TaxaService:
         gerar_tabela_button.click()
         logger.info("O botão 'Gerar Tabela' foi clicado.")
 
-        # Aguarda o tempo de download do arquivo
-        time.sleep(5)
-        downloaded_file = None
-        latest_time = 0
+        # Aguarda o download do arquivo, que o navegador só renomeia para .xls quando concluído
+        limite = time.monotonic() + CJF_DOWNLOAD_TIMEOUT_S
+        while time.monotonic() < limite:
+            downloaded_file = TaxaService.get_ultimo_arquivo_xls(diretorio)
+            if downloaded_file:
+                return downloaded_file
+            time.sleep(0.5)
 
-        # Verifica o arquivo .xls mais recente no diretório de download
-        for file in os.listdir(DOWNLOAD_PATH):
-            file_path = os.path.join(DOWNLOAD_PATH, file)
-            if file.endswith(".xls") and os.path.isfile(file_path):
-                file_mod_time = os.path.getmtime(file_path)
-                if file_mod_time > latest_time:
-                    latest_time = file_mod_time
-                    downloaded_file = file_path
-
-        # Retorna o caminho do arquivo baixado
-        return downloaded_file
+        logger.error("O download da tabela da Justiça Federal não terminou em %s s.", CJF_DOWNLOAD_TIMEOUT_S)
+        return None
 
     # Configuração e inicialização do WebDriver
     @staticmethod
-    def get_driver():
+    def get_driver(diretorio=DOWNLOAD_PATH):
         options = webdriver.ChromeOptions()
         options.add_argument("--headless")
-        prefs = {"download.default_directory": DOWNLOAD_PATH}
+        prefs = {"download.default_directory": diretorio}
         options.add_experimental_option("prefs", prefs)
         service = Service(DRIVER_PATH)
         driver = webdriver.Chrome(service=service, options=options)
+        # Evita que uma página travada prenda o navegador indefinidamente
+        driver.set_page_load_timeout(CJF_DOWNLOAD_TIMEOUT_S)
         return driver